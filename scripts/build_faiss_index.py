@@ -15,6 +15,100 @@ EMBEDDINGS_FILE = Path("data/processed/embeddings.npy")
 INDEX_FILE = Path("data/processed/books_faiss.index")
 METADATA_FILE = Path("data/processed/books_metadata.json")
 
+# Index type: "hnsw" (graph, fast approximate), "ivf" (inverted lists,
+# fast approximate) or "flat" (exact brute-force search)
+INDEX_TYPE = "hnsw"
+
+# Index parameters
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+IVF_TRAINING_POINTS_PER_LIST = 64
+
+# Rows read, normalized and added to the index at a time
+ADD_BLOCK_SIZE = 100000
+
+# Exact search settings used to check the index recall
+SEARCH_BLOCK_SIZE = 65536  # Database rows scored per block
+RECALL_QUERIES = 1000
+
+INDEX_DESCRIPTIONS = {
+    'hnsw': "IndexHNSWFlat (approximate search, cosine similarity)",
+    'ivf': "IndexIVFFlat (approximate search, cosine similarity)",
+    'flat': "IndexFlatIP (exact search, cosine similarity)",
+}
+
+def normalize_rows(embeddings):
+    """L2-normalize rows in place (einsum avoids an N x d temporary)"""
+    norms = np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))
+    np.divide(embeddings, np.maximum(norms, 1e-12)[:, None], out=embeddings)
+    return embeddings
+
+def is_normalized(embeddings, sample_size=100, tolerance=1e-3):
+    """Check whether the first rows already have unit L2 norm"""
+    sample = np.asarray(embeddings[:sample_size], dtype=np.float32)
+    return np.abs(np.sqrt(np.einsum('ij,ij->i', sample, sample)) - 1.0).max() < tolerance
+
+def load_block(embeddings, rows, normalize=True):
+    """Read rows of the (memory-mapped) embeddings as float32, optionally normalized"""
+    if normalize:
+        return normalize_rows(np.array(embeddings[rows], dtype=np.float32))
+    return np.ascontiguousarray(embeddings[rows], dtype=np.float32)
+
+def create_index(embeddings, normalize=True):
+    """Create and populate a FAISS index of type INDEX_TYPE, block by block"""
+    dimension = embeddings.shape[1]
+    
+    if INDEX_TYPE == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif INDEX_TYPE == 'ivf':
+        nlist = max(1, int(4 * np.sqrt(len(embeddings))))
+        print(f"   Training IVF index ({nlist} lists)...")
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample_size = min(len(embeddings), nlist * IVF_TRAINING_POINTS_PER_LIST)
+        sample_rows = np.sort(np.random.default_rng(0).choice(len(embeddings), sample_size, replace=False))
+        index.train(load_block(embeddings, sample_rows, normalize))
+        index.nprobe = IVF_NPROBE
+    elif INDEX_TYPE == 'flat':
+        # Inner product on normalized vectors = cosine similarity
+        index = faiss.IndexFlatIP(dimension)
+    else:
+        raise ValueError(f"Unknown INDEX_TYPE: {INDEX_TYPE}")
+    
+    print(f"   Adding {len(embeddings):,} vectors to index...")
+    for start in range(0, len(embeddings), ADD_BLOCK_SIZE):
+        index.add(load_block(embeddings, slice(start, start + ADD_BLOCK_SIZE), normalize))
+    return index
+
+def search_exact_blocked(queries, embeddings, k, normalize=True, block_size=SEARCH_BLOCK_SIZE):
+    """
+    Exact inner-product top-k search, tiled over the database.
+    Each block is scored against all queries in one matrix multiply, so it
+    stays in cache instead of the full matrix being rescanned per query.
+    """
+    rows = np.arange(len(queries))[:, None]
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_indices = np.full((len(queries), k), -1, dtype=np.int64)
+    
+    for start in range(0, len(embeddings), block_size):
+        scores = queries @ load_block(embeddings, slice(start, start + block_size), normalize).T
+        
+        # Top-k within the block, then merge with the running top-k
+        block_k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+        candidate_scores = np.concatenate([best_scores, scores[rows, top]], axis=1)
+        candidate_indices = np.concatenate([best_indices, top + start], axis=1)
+        
+        order = np.argsort(-candidate_scores, axis=1)[:, :k]
+        best_scores = candidate_scores[rows, order]
+        best_indices = candidate_indices[rows, order]
+    
+    return best_scores, best_indices
+
 def main():
     print("=" * 60)
     print("BookDNA FAISS Index Builder")
@@ -31,32 +125,29 @@ def main():
         print("   Please run preprocess_data.py first.")
         return
     
-    # Load embeddings
+    # Memory-map embeddings; blocks are paged in as the index is built
     print(f"\n1. Loading embeddings from {EMBEDDINGS_FILE}...")
-    embeddings = np.load(EMBEDDINGS_FILE)
+    embeddings = np.load(EMBEDDINGS_FILE, mmap_mode='r')
     print(f"   Shape: {embeddings.shape}")
     print(f"   Data type: {embeddings.dtype}")
     
-    # Convert to float32 if needed (FAISS requirement)
-    if embeddings.dtype != np.float32:
-        print("   Converting to float32...")
-        embeddings = embeddings.astype(np.float32)
-    
-    # Normalize embeddings for cosine similarity
+    # Blocks are converted to float32 (FAISS requirement) and normalized
+    # for cosine similarity as they are read, unless generate_embeddings.py
+    # already saved unit-length vectors
     print("\n2. Normalizing embeddings for cosine similarity...")
-    faiss.normalize_L2(embeddings)
-    print("   ✓ Normalized")
+    normalize = not is_normalized(embeddings)
+    if normalize:
+        print(f"   Normalizing in blocks of {ADD_BLOCK_SIZE:,} rows while building the index")
+    else:
+        print("   ✓ Already normalized, skipping")
     
     # Build FAISS index
     print("\n3. Building FAISS index...")
     dimension = embeddings.shape[1]
     print(f"   Dimension: {dimension}")
+    print(f"   Index type: {INDEX_TYPE}")
     
-    # Use IndexFlatIP (Inner Product) for cosine similarity on normalized vectors
-    index = faiss.IndexFlatIP(dimension)
-    
-    print(f"   Adding {len(embeddings):,} vectors to index...")
-    index.add(embeddings)
+    index = create_index(embeddings, normalize)
     
     print(f"   ✓ Index built with {index.ntotal:,} vectors")
     
@@ -70,13 +161,9 @@ def main():
     print(f"\n5. Creating metadata mapping...")
     books_df = pd.read_csv(BOOKS_FILE)
     
-    metadata = []
-    for idx, row in books_df.iterrows():
-        metadata.append({
-            'faiss_index': idx,
-            'id': int(row['id']),
-            'title': row['title']
-        })
+    metadata_df = books_df[['id', 'title']].astype({'id': int})
+    metadata_df.insert(0, 'faiss_index', np.arange(len(books_df)))
+    metadata = metadata_df.to_dict(orient='records')
     
     with open(METADATA_FILE, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
@@ -90,7 +177,7 @@ def main():
     test_index = faiss.read_index(str(INDEX_FILE))
     
     # Use first embedding as test query
-    test_query = embeddings[0:1]
+    test_query = load_block(embeddings, slice(0, 1), normalize)
     k = 5  # Return top 5 results
     
     distances, indices = test_index.search(test_query, k)
@@ -100,6 +187,18 @@ def main():
         book_title = books_df.iloc[idx]['title']
         print(f"   {i+1}. {book_title[:60]}... (similarity: {dist:.4f})")
     
+    # Compare against exact search on a sample of queries
+    num_queries = min(RECALL_QUERIES, len(embeddings))
+    print(f"\n   Measuring recall@{k} on {num_queries:,} sample queries...")
+    sample_queries = load_block(embeddings, slice(0, num_queries), normalize)
+    _, exact_indices = search_exact_blocked(sample_queries, embeddings, k, normalize)
+    _, index_indices = test_index.search(sample_queries, k)
+    recall = np.mean([
+        len(set(found) & set(expected)) / k
+        for found, expected in zip(index_indices, exact_indices)
+    ])
+    print(f"   Recall@{k}: {recall:.4f}")
+    
     print("\n" + "=" * 60)
     print("✓ FAISS index creation complete!")
     print("=" * 60)
@@ -107,7 +206,8 @@ def main():
     print("\nIndex Statistics:")
     print(f"  - Total vectors: {test_index.ntotal:,}")
     print(f"  - Dimension: {dimension}")
-    print(f"  - Index type: IndexFlatIP (exact search, cosine similarity)")
+    print(f"  - Index type: {INDEX_DESCRIPTIONS[INDEX_TYPE]}")
+    print(f"  - Recall@{k}: {recall:.4f}")
     print(f"  - File size: {file_size_mb:.2f} MB")
     
     print(f"\nNext step: Set up Supabase and run upload_to_supabase.py")
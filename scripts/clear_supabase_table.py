@@ -37,18 +37,18 @@ def main():
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     print("   ✓ Connected")
     
-    print("\n2. Deleting all books...")
+    print("\n2. Truncating books table...")
     try:
-        # Delete all records
-        result = supabase.table('books').delete().neq('id', -1).execute()
-        print("   ✓ All books deleted!")
+        # TRUNCATE drops the data without scanning and logging every row
+        supabase.rpc('exec_sql', {'sql': 'TRUNCATE TABLE books RESTART IDENTITY CASCADE'}).execute()
+        print("   ✓ Table truncated!")
     except Exception as e:
-        print(f"   ❌ Error: {e}")
-        print("\n   Trying alternative method (truncate via RPC)...")
+        print(f"   ⚠️  TRUNCATE via RPC failed: {str(e)[:100]}")
+        print("\n   Trying alternative method (delete all rows)...")
         try:
-            # Alternative: use SQL truncate
-            supabase.rpc('exec_sql', {'sql': 'TRUNCATE TABLE books RESTART IDENTITY CASCADE'}).execute()
-            print("   ✓ Table truncated!")
+            # Alternative: delete all records (slow on large tables)
+            result = supabase.table('books').delete().neq('id', -1).execute()
+            print("   ✓ All books deleted!")
         except Exception as e2:
             print(f"   ❌ Error: {e2}")
             print("\n   You may need to truncate manually in Supabase dashboard:")
@@ -7,13 +7,32 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
 import torch
 
 # Paths
 INPUT_FILE = Path("data/processed/books_clean.csv")
 OUTPUT_FILE = Path("data/processed/embeddings.npy")
 
+def compile_model(model, sorted_texts):
+    """
+    Compile the transformer with torch.compile to cut per-batch Python
+    overhead, warming it up on texts spanning the range of lengths.
+    Falls back to eager mode if compilation fails.
+    """
+    print("   Compiling model with torch.compile...")
+    eager_model = model[0].auto_model
+    model[0].auto_model = torch.compile(eager_model, dynamic=True)
+    
+    # Shortest, quartile and longest texts (texts are sorted by token length)
+    last = len(sorted_texts) - 1
+    warmup_texts = [sorted_texts[int(q * last)] for q in (0, 0.25, 0.5, 0.75, 1)]
+    try:
+        model.encode(warmup_texts, batch_size=len(warmup_texts), show_progress_bar=False)
+        print("   ✓ Compiled")
+    except Exception as e:
+        print(f"   ⚠️  torch.compile failed ({str(e)[:80]}), using eager mode")
+        model[0].auto_model = eager_model
+
 def main():
     print("=" * 60)
     print("BookDNA Embedding Generation")
@@ -40,27 +59,59 @@ def main():
     model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device=device)
     print(f"   Embedding dimension: {model.get_sentence_embedding_dimension()}")
     
-    # Generate embeddings in batches
+    # Use half precision on GPU (tensor cores, half the activation memory)
+    if device == 'cuda':
+        model.half()
+        print("   Precision: FP16")
+    
+    # Generate embeddings in length-sorted batches
     print("\n4. Generating embeddings...")
-    batch_size = 32
-    embeddings = []
+    batch_size = 256 if device == 'cuda' else 128
     
     # Get embedding texts
     embedding_texts = books_df['embedding_text'].tolist()
     
-    # Process in batches with progress bar
-    for i in tqdm(range(0, len(embedding_texts), batch_size), desc="   Processing batches"):
-        batch = embedding_texts[i:i+batch_size]
-        batch_embeddings = model.encode(
-            batch,
+    # Sort texts by token length so each batch pads to a similar length
+    print("   Sorting texts by token length...")
+    token_ids = model.tokenizer(
+        embedding_texts,
+        add_special_tokens=True,
+        truncation=True,
+        max_length=model.max_seq_length
+    )['input_ids']
+    token_lengths = np.array([len(ids) for ids in token_ids])
+    order = np.argsort(token_lengths, kind='stable')
+    
+    sorted_texts = [embedding_texts[i] for i in order]
+    
+    num_gpus = torch.cuda.device_count()
+    if num_gpus > 1:
+        # Shard batches across all GPUs (results come back in input order)
+        print(f"   Encoding on {num_gpus} GPUs...")
+        pool = model.start_multi_process_pool(target_devices=[f'cuda:{i}' for i in range(num_gpus)])
+        try:
+            sorted_embeddings = model.encode_multi_process(
+                sorted_texts,
+                pool,
+                batch_size=batch_size,
+                normalize_embeddings=True  # Unit length, ready for FAISS inner product
+            )
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        if device == 'cuda':
+            compile_model(model, sorted_texts)
+        
+        sorted_embeddings = model.encode(
+            sorted_texts,
+            batch_size=batch_size,
             convert_to_numpy=True,
-            show_progress_bar=False,
-            normalize_embeddings=False  # We'll normalize later for FAISS
+            show_progress_bar=True,
+            normalize_embeddings=True  # Unit length, ready for FAISS inner product
         )
-        embeddings.append(batch_embeddings)
     
-    # Concatenate all embeddings
-    embeddings_array = np.vstack(embeddings)
+    # Restore the original book order (FAISS requires float32)
+    embeddings_array = sorted_embeddings[np.argsort(order)].astype(np.float32)
     print(f"\n   Generated embeddings shape: {embeddings_array.shape}")
     
     # Save embeddings
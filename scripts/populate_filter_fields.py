@@ -7,6 +7,7 @@ Populate missing filter fields for Phase 2 features:
 
 import os
 import re
+import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client
 from tqdm import tqdm
@@ -61,13 +62,22 @@ CATEGORY_PAGE_COUNTS = {
 
 DEFAULT_PAGE_COUNT = 320  # Default for books without matching categories
 
+# Lowercased lookup keys, computed once instead of on every check
+_BEGINNER_KEYS = tuple(cat.lower() for cat in BEGINNER_CATEGORIES)
+_ADVANCED_KEYS = tuple(cat.lower() for cat in ADVANCED_CATEGORIES)
+_PAGE_COUNT_KEYS = tuple((cat.lower(), count) for cat, count in CATEGORY_PAGE_COUNTS.items())
+
+# 4-digit year between 1800 and 2099
+YEAR_PATTERN = r'\b(1[89]\d{2}|20\d{2})\b'
+_YEAR_RE = re.compile(YEAR_PATTERN)
+
 def extract_year(published_date):
     """Extract year from published_date string"""
     if not published_date or not isinstance(published_date, str):
         return None
     
     # Try to extract 4-digit year
-    match = re.search(r'\b(1[89]\d{2}|20\d{2})\b', published_date)
+    match = _YEAR_RE.search(published_date)
     if match:
         year = int(match.group(1))
         # Sanity check: only accept years between 1800 and 2030
@@ -76,6 +86,16 @@ def extract_year(published_date):
     
     return None
 
+def extract_years(published_dates):
+    """Vectorized extract_year over a list of published_date values"""
+    dates = pd.Series(published_dates, dtype=object).fillna('').astype(str)
+    
+    years = pd.to_numeric(dates.str.extract(YEAR_PATTERN, expand=False), errors='coerce').astype('Int64')
+    # Sanity check: only accept years between 1800 and 2030
+    years = years.where(years.between(1800, 2030))
+    
+    return [int(y) if pd.notna(y) else None for y in years]
+
 def determine_reading_level(categories):
     """Determine reading level based on categories"""
     if not categories or not isinstance(categories, list):
@@ -84,14 +104,12 @@ def determine_reading_level(categories):
     categories_str = ' '.join(str(cat) for cat in categories).lower()
     
     # Check for beginner indicators
-    for beginner_cat in BEGINNER_CATEGORIES:
-        if beginner_cat.lower() in categories_str:
-            return 'beginner'
+    if any(key in categories_str for key in _BEGINNER_KEYS):
+        return 'beginner'
     
     # Check for advanced indicators
-    for advanced_cat in ADVANCED_CATEGORIES:
-        if advanced_cat.lower() in categories_str:
-            return 'advanced'
+    if any(key in categories_str for key in _ADVANCED_KEYS):
+        return 'advanced'
     
     return 'intermediate'
 
@@ -104,14 +122,34 @@ def estimate_page_count(categories):
     for category in categories:
         if not isinstance(category, str):
             continue
+        category_lc = category.lower()
         
         # Check for exact or partial matches
-        for cat_key, page_count in CATEGORY_PAGE_COUNTS.items():
-            if cat_key.lower() in category.lower():
+        for cat_key, page_count in _PAGE_COUNT_KEYS:
+            if cat_key in category_lc:
                 return page_count
     
     return DEFAULT_PAGE_COUNT
 
+def upsert_updates(updates, chunk_size=100):
+    """Write updates with a single upsert, falling back to smaller chunks"""
+    try:
+        supabase.table('books').upsert(updates, on_conflict='id').execute()
+        return len(updates)
+    except Exception as e:
+        print(f"Bulk upsert failed ({str(e)[:100]}), retrying in chunks of {chunk_size}...")
+    
+    updated = 0
+    for i in tqdm(range(0, len(updates), chunk_size), desc="Updating"):
+        chunk = updates[i:i + chunk_size]
+        try:
+            supabase.table('books').upsert(chunk, on_conflict='id').execute()
+            updated += len(chunk)
+        except Exception as e:
+            print(f"Error updating books {chunk[0]['id']}-{chunk[-1]['id']}: {e}")
+    
+    return updated
+
 def update_books_in_batches(batch_size=500):
     """Update books in batches to populate filter fields"""
     
@@ -124,7 +162,7 @@ def update_books_in_batches(batch_size=500):
     while True:
         # Fetch batch of books
         response = supabase.table('books')\
-            .select('id, published_date, categories')\
+            .select('id, title, faiss_index, published_date, categories')\
             .is_('published_year', 'null')\
             .range(offset, offset + batch_size - 1)\
             .execute()
@@ -136,43 +174,35 @@ def update_books_in_batches(batch_size=500):
         
         print(f"\nProcessing batch starting at offset {offset} ({len(books)} books)...")
         
+        # Extract publication years for the whole batch at once
+        published_years = extract_years([book.get('published_date') for book in books])
+        
         # Prepare updates
         updates = []
-        for book in tqdm(books, desc="Preparing updates"):
+        for book, published_year in tqdm(zip(books, published_years), total=len(books), desc="Preparing updates"):
             book_id = book['id']
-            published_date = book.get('published_date')
             categories = book.get('categories', [])
             
             # Calculate new field values
-            published_year = extract_year(published_date)
             reading_level = determine_reading_level(categories)
             page_count = estimate_page_count(categories)
             
             # Only update if we have at least published_year
             if published_year:
+                # title/faiss_index are NOT NULL, so the upsert row must carry them
                 updates.append({
                     'id': book_id,
+                    'title': book['title'],
+                    'faiss_index': book['faiss_index'],
                     'published_year': published_year,
                     'reading_level': reading_level,
                     'page_count': page_count
                 })
         
-        # Batch update
+        # Batch update (one upsert request per batch instead of one per book)
         if updates:
             print(f"Updating {len(updates)} books in database...")
-            for update in tqdm(updates, desc="Updating"):
-                try:
-                    supabase.table('books')\
-                        .update({
-                            'published_year': update['published_year'],
-                            'reading_level': update['reading_level'],
-                            'page_count': update['page_count']
-                        })\
-                        .eq('id', update['id'])\
-                        .execute()
-                    total_updated += 1
-                except Exception as e:
-                    print(f"Error updating book {update['id']}: {e}")
+            total_updated += upsert_updates(updates)
         
         offset += batch_size
         
@@ -1,9 +1,13 @@
 """
-Prepare CSV with embeddings for bulk import
+Prepare books with embeddings for bulk import
+Writes Parquet (embeddings stored as raw float32) and a CSV for the
+Supabase dashboard importer, which only accepts CSV
 """
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from tqdm import tqdm
 import json
@@ -12,6 +16,7 @@ import json
 EMBEDDINGS_FILE = Path("data/processed/embeddings.npy")
 BOOKS_FILE = Path("data/processed/books_clean.csv")
 OUTPUT_FILE = Path("data/processed/books_with_embeddings.csv")
+PARQUET_FILE = Path("data/processed/books_with_embeddings.parquet")
 
 def main():
     print("=" * 60)
@@ -19,36 +24,53 @@ def main():
     print("=" * 60)
     
     print("\n1. Loading embeddings...")
-    embeddings = np.load(EMBEDDINGS_FILE)
+    embeddings = np.load(EMBEDDINGS_FILE, mmap_mode='r')
     print(f"   Loaded {embeddings.shape[0]:,} embeddings")
     
     print("\n2. Loading books...")
     books_df = pd.read_csv(BOOKS_FILE)
     print(f"   Loaded {len(books_df):,} books")
     
-    print("\n3. Adding embeddings to dataframe...")
+    print("\n3. Saving to Parquet...")
+    # Reorder embeddings to match the books rows as one contiguous float32 block
+    ordered_embeddings = np.ascontiguousarray(embeddings[books_df['id'].to_numpy()], dtype=np.float32)
+    
+    # Wrap the float32 buffer as a fixed-size list column (zero-copy)
+    embedding_column = pa.FixedSizeListArray.from_arrays(
+        pa.array(ordered_embeddings.ravel(), type=pa.float32()),
+        ordered_embeddings.shape[1]
+    )
+    table = pa.Table.from_pandas(books_df, preserve_index=False).append_column('embedding', embedding_column)
+    pq.write_table(table, PARQUET_FILE, compression='zstd')
+    file_size_mb = PARQUET_FILE.stat().st_size / 1024 / 1024
+    print(f"   ✓ Saved to {PARQUET_FILE} ({file_size_mb:.1f} MB)")
+    
+    print("\n4. Adding embeddings to dataframe...")
     
     # Convert embeddings to string format for PostgreSQL vector type
-    embedding_strings = []
-    for i in tqdm(range(len(books_df)), desc="   Converting"):
-        book_id = books_df.iloc[i]['id']
-        embedding = embeddings[book_id]
-        # Format as [1.23,4.56,7.89,...]
-        embedding_str = f"[{','.join(map(str, embedding))}]"
-        embedding_strings.append(embedding_str)
+    # Format as [1.23,4.56,7.89,...] with one %-format call per row
+    # (%.9g round-trips float32 exactly)
+    row_format = '[' + ','.join(['%.9g'] * ordered_embeddings.shape[1]) + ']'
+    embedding_strings = [
+        row_format % tuple(embedding)
+        for embedding in tqdm(ordered_embeddings.tolist(), desc="   Converting")
+    ]
     
     books_df['embedding'] = embedding_strings
     
-    print("\n4. Saving to CSV...")
+    print("\n5. Saving to CSV...")
     books_df.to_csv(OUTPUT_FILE, index=False)
     file_size_mb = OUTPUT_FILE.stat().st_size / 1024 / 1024
     print(f"   ✓ Saved to {OUTPUT_FILE} ({file_size_mb:.1f} MB)")
     
     print("\n" + "=" * 60)
-    print("✓ CSV prepared!")
+    print("✓ Parquet and CSV prepared!")
     print("=" * 60)
     
-    print("\nNow upload this CSV to Supabase:")
+    print(f"\nParquet (float32 embeddings, zstd): {PARQUET_FILE}")
+    print("Use it for scripted imports and for reading embeddings back in Python.")
+    
+    print("\nFor the dashboard, upload the CSV to Supabase:")
     print("1. Go to Supabase Dashboard > Table Editor > books")
     print("2. Click 'Import data from CSV'")
     print(f"3. Upload: {OUTPUT_FILE}")
@@ -56,4 +78,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
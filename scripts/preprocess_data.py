@@ -5,6 +5,9 @@ Processes books_data.csv and Books_rating.csv to create clean, enriched dataset
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import json
 import ast
 from pathlib import Path
@@ -15,6 +18,29 @@ from collections import defaultdict
 OUTPUT_DIR = Path("data/processed")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Columns of books_data.csv used by the pipeline
+BOOK_COLUMNS = [
+    'Title', 'description', 'authors', 'categories', 'image',
+    'previewLink', 'infoLink', 'publisher', 'publishedDate', 'ratingsCount'
+]
+
+# Columns of Books_rating.csv used by the pipeline
+REVIEW_COLUMN_TYPES = {
+    'Title': pa.string(),
+    'review/score': pa.float64(),
+    'review/helpfulness': pa.string(),
+    'review/summary': pa.string(),
+    'review/text': pa.string(),
+}
+
+# Review fields for books without any reviews
+EMPTY_REVIEWS = {
+    'review_count': 0,
+    'avg_score': 0.0,
+    'review_summary': '',
+    'top_reviews': []
+}
+
 def safe_parse_list(val):
     """Safely parse string representations of lists"""
     if pd.isna(val) or val == '':
@@ -36,52 +62,40 @@ def clean_text(text):
     text = ' '.join(text.split())
     return text
 
-def aggregate_reviews(reviews_df, title):
-    """Aggregate reviews for a single book"""
-    book_reviews = reviews_df[reviews_df['Title'] == title].copy()
-    
-    if len(book_reviews) == 0:
-        return {
-            'review_count': 0,
-            'avg_score': 0.0,
-            'review_summary': '',
-            'top_reviews': []
-        }
-    
-    # Calculate average score
-    avg_score = book_reviews['review/score'].mean()
-    
-    # Get top helpful reviews (up to 3)
-    book_reviews['helpfulness_score'] = 0.0  # Initialize as float
-    for idx, row in book_reviews.iterrows():
-        help_str = str(row['review/helpfulness'])
-        if '/' in help_str:
-            try:
-                parts = help_str.split('/')
-                helpful = int(parts[0])
-                total = int(parts[1])
-                if total > 0:
-                    book_reviews.loc[idx, 'helpfulness_score'] = float(helpful / total)
-            except:
-                pass
-    
-    top_reviews = book_reviews.nlargest(3, 'helpfulness_score')
+def add_helpfulness_score(reviews_df):
+    """Parse "helpful/total" into a ratio column (0 when unparseable or total is 0)"""
+    parts = reviews_df['review/helpfulness'].str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+    helpful = pd.to_numeric(parts[0], errors='coerce')
+    total = pd.to_numeric(parts[1], errors='coerce')
+    reviews_df['helpfulness_score'] = (helpful / total.where(total > 0)).fillna(0.0).astype('float32')
+    return reviews_df
+
+def aggregate_reviews(reviews_df):
+    """Aggregate reviews for all books in one groupby pass, keyed by title"""
+    # Review count and average score per book
+    stats = reviews_df.groupby('Title', sort=False)['review/score'].agg(['size', 'mean'])
+    
+    # Top helpful reviews (up to 3) per book
+    top_reviews = reviews_df.sort_values('helpfulness_score', ascending=False, kind='stable')\
+        .groupby('Title', sort=False).head(3)
+    summaries = top_reviews['review/summary'].map(clean_text)
+    texts = top_reviews['review/text'].map(clean_text)
+    # Only include shorter reviews, truncated
+    texts = texts.where(texts.str.len() < 500, '').str[:200]
     
     # Combine review summaries and text
-    review_texts = []
-    for _, review in top_reviews.iterrows():
-        summary = clean_text(review['review/summary'])
-        text = clean_text(review['review/text'])
-        if summary:
-            review_texts.append(summary)
-        if text and len(text) < 500:  # Only include shorter reviews
-            review_texts.append(text[:200])  # Truncate long reviews
+    review_texts = defaultdict(list)
+    for title, summary, text in zip(top_reviews['Title'], summaries, texts):
+        review_texts[title].extend(part for part in (summary, text) if part)
     
     return {
-        'review_count': len(book_reviews),
-        'avg_score': float(avg_score),
-        'review_summary': ' '.join(review_texts[:5]),  # Top 5 snippets
-        'top_reviews': review_texts[:3]
+        title: {
+            'review_count': int(count),
+            'avg_score': float(avg_score),
+            'review_summary': ' '.join(review_texts[title][:5]),  # Top 5 snippets
+            'top_reviews': review_texts[title][:3]
+        }
+        for title, count, avg_score in zip(stats.index, stats['size'], stats['mean'])
     }
 
 def main():
@@ -91,22 +105,30 @@ def main():
     
     # Load books data
     print("\n1. Loading books_data.csv...")
-    books_df = pd.read_csv('data/books_data.csv')
+    books_df = pd.read_csv('data/books_data.csv', usecols=BOOK_COLUMNS)
     print(f"   Loaded {len(books_df):,} books")
     
-    # Load reviews data in chunks (large file)
-    print("\n2. Loading Books_rating.csv in chunks...")
-    chunk_size = 50000
-    reviews_chunks = []
-    total_reviews = 0
+    # Load reviews data (large file) with the multithreaded Arrow reader,
+    # materializing only the columns we use
+    print("\n2. Loading Books_rating.csv...")
     
     try:
-        for chunk in tqdm(pd.read_csv('data/Books_rating.csv', chunksize=chunk_size), desc="   Reading chunks"):
-            reviews_chunks.append(chunk)
-            total_reviews += len(chunk)
+        reviews_table = pacsv.read_csv(
+            'data/Books_rating.csv',
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=list(REVIEW_COLUMN_TYPES),
+                column_types=REVIEW_COLUMN_TYPES,
+                strings_can_be_null=True
+            )
+        )
+        print(f"   Loaded {reviews_table.num_rows:,} reviews")
         
-        reviews_df = pd.concat(reviews_chunks, ignore_index=True)
-        print(f"   Loaded {total_reviews:,} reviews")
+        # Keep only reviews of books we have, before converting to pandas
+        book_titles = pa.array(books_df['Title'].dropna().unique(), type=pa.string())
+        reviews_table = reviews_table.filter(pc.is_in(reviews_table['Title'], value_set=book_titles))
+        reviews_df = add_helpfulness_score(reviews_table.to_pandas())
+        print(f"   Kept {len(reviews_df):,} reviews of books in books_data.csv")
     except Exception as e:
         print(f"   Warning: Could not load reviews file: {e}")
         print("   Continuing without reviews data...")
@@ -128,30 +150,15 @@ def main():
     
     # Aggregate reviews per book
     print("\n4. Aggregating reviews per book...")
-    review_data = []
-    
     if not reviews_df.empty:
-        # Get unique titles from books that have reviews
-        reviewed_titles = set(reviews_df['Title'].unique())
-        
-        for title in tqdm(books_df['Title'], desc="   Processing"):
-            if title in reviewed_titles:
-                agg = aggregate_reviews(reviews_df, title)
-            else:
-                agg = {
-                    'review_count': 0,
-                    'avg_score': 0.0,
-                    'review_summary': '',
-                    'top_reviews': []
-                }
-            review_data.append(agg)
+        # One groupby over all reviews, then an O(1) lookup per book
+        reviews_by_title = aggregate_reviews(reviews_df)
+        review_data = [
+            reviews_by_title.get(title, EMPTY_REVIEWS)
+            for title in tqdm(books_df['Title'], desc="   Processing")
+        ]
     else:
-        review_data = [{
-            'review_count': 0,
-            'avg_score': 0.0,
-            'review_summary': '',
-            'top_reviews': []
-        } for _ in range(len(books_df))]
+        review_data = [EMPTY_REVIEWS] * len(books_df)
     
     # Add review data to dataframe
     books_df['review_count'] = [r['review_count'] for r in review_data]
@@ -161,36 +168,20 @@ def main():
     # Create rich embedding_text field
     print("\n5. Creating embedding_text field...")
     
-    def create_embedding_text(row):
-        parts = []
-        
-        # Title (2x weight)
-        if row['title_clean']:
-            parts.append(row['title_clean'])
-            parts.append(row['title_clean'])
-        
-        # Description (3x weight)
-        if row['description_clean']:
-            parts.append(row['description_clean'])
-            parts.append(row['description_clean'])
-            parts.append(row['description_clean'])
-        
-        # Authors
-        if row['authors_parsed']:
-            parts.append(' '.join(row['authors_parsed']))
-        
-        # Categories
-        if row['categories_parsed']:
-            parts.append(' '.join(row['categories_parsed']))
-        
-        # Review summary (2x weight)
-        if row['review_summary']:
-            parts.append(row['review_summary'])
-            parts.append(row['review_summary'])
-        
-        return ' '.join(parts)
-    
-    books_df['embedding_text'] = books_df.apply(create_embedding_text, axis=1)
+    def weighted(texts, weight):
+        """Repeat each non-empty text `weight` times, space-terminated"""
+        return (texts + ' ').str.repeat(weight).where(texts != '', '')
+    
+    # Title (2x), description (3x), authors, categories, review summary (2x)
+    embedding_text = (
+        weighted(books_df['title_clean'], 2) +
+        weighted(books_df['description_clean'], 3) +
+        weighted(books_df['authors_parsed'].str.join(' '), 1) +
+        weighted(books_df['categories_parsed'].str.join(' '), 1) +
+        weighted(books_df['review_summary'], 2)
+    )
+    # Drop the trailing separator
+    books_df['embedding_text'] = embedding_text.str[:-1]
     
     # Filter out books with insufficient data
     print("\n6. Filtering books...")
@@ -230,6 +221,12 @@ def main():
     print(f"\n   Saved to: {output_path}")
     print(f"   File size: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
     
+    # Save to Parquet (typed columns, fast re-reads for the upload scripts)
+    parquet_path = OUTPUT_DIR / 'books_clean.parquet'
+    final_df.to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False)
+    print(f"   Saved to: {parquet_path}")
+    print(f"   File size: {parquet_path.stat().st_size / 1024 / 1024:.2f} MB")
+    
     # Print statistics
     print("\n" + "=" * 60)
     print("Statistics:")
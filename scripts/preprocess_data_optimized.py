@@ -6,36 +6,79 @@ Processes books_data.csv and Books_rating.csv to create clean, enriched dataset
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import json
+import orjson
 import ast
+import re
 from pathlib import Path
-from tqdm import tqdm
-from collections import defaultdict
+
+# Copy-on-Write: derived frames share unchanged columns instead of copying,
+# and column assignment on filtered frames never writes through (always on
+# from pandas 3.0, where the option is deprecated)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # Create output directory
 OUTPUT_DIR = Path("data/processed")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Columns of books_data.csv used by the pipeline
+BOOK_COLUMNS = [
+    'Title', 'description', 'authors', 'categories', 'image',
+    'previewLink', 'infoLink', 'publisher', 'publishedDate', 'ratingsCount'
+]
+
+# Columns of Books_rating.csv used by the pipeline
+REVIEW_COLUMN_TYPES = {
+    'Title': pa.string(),
+    'review/score': pa.float32(),
+    'review/helpfulness': pa.string(),
+    'review/summary': pa.string(),
+    'review/text': pa.string(),
+}
+
+# Simple list literal such as "['Author One', 'Author Two']"
+_SIMPLE_LIST = re.compile(r"^\[.*\]$", re.DOTALL)
+
 def safe_parse_list(val):
     """Safely parse string representations of lists"""
     if pd.isna(val) or val == '':
         return []
     if isinstance(val, list):
         return val
+    # Fast path: without double quotes or escapes, swapping quote styles turns
+    # a Python list literal into JSON, which parses much faster than an AST
+    if '"' not in val and '\\' not in val and _SIMPLE_LIST.match(val):
+        try:
+            parsed = json.loads(val.replace("'", '"'))
+            return parsed if isinstance(parsed, list) else [str(parsed)]
+        except ValueError:
+            pass
     try:
         parsed = ast.literal_eval(val)
         return parsed if isinstance(parsed, list) else [str(parsed)]
     except:
         return [str(val)]
 
-def clean_text(text):
-    """Clean and normalize text"""
-    if pd.isna(text) or text == '':
-        return ''
-    text = str(text).strip()
-    # Remove extra whitespace
-    text = ' '.join(text.split())
-    return text
+def clean_text(texts):
+    """Clean and normalize a column of text (missing values become '')"""
+    # Collapse whitespace runs and trim, all in vectorized string kernels
+    return texts.astype('string').fillna('').str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def read_csv_arrow(path, columns, column_types=None):
+    """Read a CSV with the multithreaded Arrow reader into Arrow-backed pandas columns"""
+    table = pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types=column_types,
+            strings_can_be_null=True
+        )
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
 
 def aggregate_reviews_vectorized(reviews_df):
     """
@@ -44,43 +87,43 @@ def aggregate_reviews_vectorized(reviews_df):
     """
     print("\n   Computing helpfulness scores...")
     
-    # Parse helpfulness column vectorized
-    def parse_helpfulness(help_str):
-        if pd.isna(help_str) or help_str == '':
-            return 0.0
-        help_str = str(help_str)
-        if '/' in help_str:
-            try:
-                parts = help_str.split('/')
-                helpful = int(parts[0])
-                total = int(parts[1])
-                return helpful / total if total > 0 else 0.0
-            except:
-                return 0.0
-        return 0.0
-    
-    # Vectorized helpfulness calculation
-    reviews_df['helpfulness_score'] = reviews_df['review/helpfulness'].apply(parse_helpfulness)
+    # Parse "helpful/total" column vectorized (0 when unparseable or total is 0)
+    parts = reviews_df['review/helpfulness'].fillna('0/0').str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+    helpful = np.nan_to_num(pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan))
+    total = np.nan_to_num(pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan))
+    reviews_df['helpfulness_score'] = np.where(total > 0, helpful / np.maximum(total, 1), 0.0).astype(np.float32)
     
     print("   Grouping reviews by book...")
     
-    # Group by title and aggregate
-    aggregated = reviews_df.groupby('Title').agg({
-        'review/score': ['count', 'mean'],
-        'helpfulness_score': 'max',  # We'll use this to identify top reviews
-        'review/summary': lambda x: ' '.join([clean_text(s) for s in x.dropna().head(3)]),
-        'review/text': lambda x: ' '.join([clean_text(t)[:200] for t in x.dropna().head(3)])
-    })
+    # Clean text columns once with vectorized string kernels
+    reviews_df['summary_clean'] = clean_text(reviews_df['review/summary'])
+    reviews_df['text_clean'] = clean_text(reviews_df['review/text']).str.slice(0, 200)
     
-    # Flatten column names
-    aggregated.columns = ['review_count', 'avg_score', 'max_helpfulness', 'review_summaries', 'review_texts']
+    # Group by title and aggregate scores with builtin reducers
+    aggregated = reviews_df.groupby('Title', observed=True).agg(
+        review_count=('review/score', 'count'),
+        score_sum=('review/score', 'sum'),
+    )
+    # Scores are stored as float32; take the mean in float64
+    aggregated['avg_score'] = aggregated['score_sum'].astype(np.float64) / aggregated['review_count']
     
-    # Combine summaries and texts
+    # Keep the 3 most helpful reviews per book (stable sort keeps file order on ties)
+    # (sort only the columns we need, not the raw review text)
+    top_reviews = reviews_df[['Title', 'helpfulness_score', 'summary_clean', 'text_clean']]
+    top_reviews = top_reviews.sort_values('helpfulness_score', ascending=False, kind='stable')
+    top_reviews = top_reviews.groupby('Title', observed=True).head(3)
+    snippets = top_reviews.groupby('Title', observed=True).agg(
+        review_summaries=('summary_clean', ' '.join),
+        review_texts=('text_clean', ' '.join),
+    )
+    aggregated = aggregated.join(snippets)
+    
+    # Combine summaries and texts (collapsing gaps left by empty reviews)
     aggregated['review_summary'] = aggregated['review_summaries'] + ' ' + aggregated['review_texts']
-    aggregated['review_summary'] = aggregated['review_summary'].str.strip()
+    aggregated['review_summary'] = clean_text(aggregated['review_summary'])
     
     # Drop intermediate columns
-    aggregated = aggregated.drop(['review_summaries', 'review_texts', 'max_helpfulness'], axis=1)
+    aggregated = aggregated.drop(['score_sum', 'review_summaries', 'review_texts'], axis=1)
     
     return aggregated.reset_index()
 
@@ -91,22 +134,26 @@ def main():
     
     # Load books data
     print("\n1. Loading books_data.csv...")
-    books_df = pd.read_csv('data/books_data.csv')
+    books_df = read_csv_arrow('data/books_data.csv', BOOK_COLUMNS)
+    # Title vocabulary shared with the reviews, so grouping and the merge
+    # work on integer category codes instead of hashing title strings
+    books_df['Title'] = books_df['Title'].astype('category')
     print(f"   Loaded {len(books_df):,} books")
     
-    # Load reviews data in chunks (large file)
-    print("\n2. Loading Books_rating.csv in chunks...")
-    chunk_size = 100000
-    reviews_chunks = []
-    total_reviews = 0
+    # Load reviews data (large file) in one multithreaded Arrow pass
+    print("\n2. Loading Books_rating.csv...")
     
     try:
-        for chunk in tqdm(pd.read_csv('data/Books_rating.csv', chunksize=chunk_size), desc="   Reading chunks"):
-            reviews_chunks.append(chunk)
-            total_reviews += len(chunk)
+        reviews_df = read_csv_arrow('data/Books_rating.csv', list(REVIEW_COLUMN_TYPES), REVIEW_COLUMN_TYPES)
+        print(f"   Loaded {len(reviews_df):,} reviews")
         
-        reviews_df = pd.concat(reviews_chunks, ignore_index=True)
-        print(f"   Loaded {total_reviews:,} reviews")
+        # Encode with the books' categories; reviews of unknown books become NaN
+        title_dtype = books_df['Title'].dtype
+        reviews_df['Title'] = pd.Categorical.from_codes(
+            title_dtype.categories.get_indexer(reviews_df['Title']), dtype=title_dtype
+        )
+        reviews_df = reviews_df[reviews_df['Title'].notna()]
+        print(f"   Kept {len(reviews_df):,} reviews of books in books_data.csv")
     except Exception as e:
         print(f"   Warning: Could not load reviews file: {e}")
         print("   Continuing without reviews data...")
@@ -117,16 +164,13 @@ def main():
     
     # Parse authors and categories
     print("   Parsing authors and categories...")
-    books_df['authors_parsed'] = books_df['authors'].apply(safe_parse_list)
-    books_df['categories_parsed'] = books_df['categories'].apply(safe_parse_list)
+    books_df['authors_parsed'] = books_df['authors'].map(safe_parse_list)
+    books_df['categories_parsed'] = books_df['categories'].map(safe_parse_list)
     
     # Clean text fields
     print("   Cleaning text fields...")
-    books_df['title_clean'] = books_df['Title'].apply(clean_text)
-    books_df['description_clean'] = books_df['description'].apply(clean_text)
-    
-    # Fill missing descriptions
-    books_df['description_clean'] = books_df['description_clean'].fillna('')
+    books_df['title_clean'] = clean_text(books_df['Title'])
+    books_df['description_clean'] = clean_text(books_df['description'])
     
     # Aggregate reviews per book (OPTIMIZED - all at once!)
     print("\n4. Aggregating reviews per book (vectorized)...")
@@ -134,6 +178,8 @@ def main():
     if not reviews_df.empty:
         # Vectorized aggregation - much faster!
         review_aggregated = aggregate_reviews_vectorized(reviews_df)
+        # Only the small per-title aggregates are needed from here on
+        del reviews_df
         
         # Merge with books data
         print("   Merging review data with books...")
@@ -158,34 +204,21 @@ def main():
     # Create rich embedding_text field
     print("\n5. Creating embedding_text field...")
     
-    def create_embedding_text(row):
-        parts = []
-        
-        # Title (2x weight)
-        if row['title_clean']:
-            parts.extend([row['title_clean']] * 2)
-        
-        # Description (3x weight)
-        if row['description_clean']:
-            parts.extend([row['description_clean']] * 3)
-        
-        # Authors
-        if row['authors_parsed']:
-            parts.append(' '.join(row['authors_parsed']))
-        
-        # Categories
-        if row['categories_parsed']:
-            parts.append(' '.join(row['categories_parsed']))
-        
-        # Review summary (2x weight)
-        if row['review_summary']:
-            parts.extend([row['review_summary']] * 2)
-        
-        return ' '.join(parts)
+    def weighted(texts, weight):
+        """Repeat each non-empty text `weight` times, space-terminated"""
+        return (texts + ' ').str.repeat(weight).where(texts != '', '')
     
-    # Vectorized embedding text creation with progress bar
-    tqdm.pandas(desc="   Creating embeddings")
-    books_df['embedding_text'] = books_df.progress_apply(create_embedding_text, axis=1)
+    # Vectorized string concatenation (no per-row Python calls)
+    # Title (2x), description (3x), authors, categories, review summary (2x)
+    embedding_text = (
+        weighted(books_df['title_clean'], 2) +
+        weighted(books_df['description_clean'], 3) +
+        weighted(books_df['authors_parsed'].str.join(' '), 1) +
+        weighted(books_df['categories_parsed'].str.join(' '), 1) +
+        weighted(books_df['review_summary'], 2)
+    )
+    # Drop the trailing separator
+    books_df['embedding_text'] = embedding_text.str[:-1]
     
     # Filter out books with insufficient data
     print("\n6. Filtering books...")
@@ -202,21 +235,25 @@ def main():
     # Create final clean dataset
     print("\n7. Creating final dataset...")
     
+    # Pull each column out once as a plain array, filling missing values
+    # during the conversion instead of through intermediate Series copies
+    ratings = pd.to_numeric(books_df['ratingsCount'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    
     final_df = pd.DataFrame({
-        'id': range(len(books_df)),
-        'title': books_df['title_clean'].values,
-        'description': books_df['description_clean'].values,
-        'authors': books_df['authors_parsed'].apply(json.dumps).values,
-        'categories': books_df['categories_parsed'].apply(json.dumps).values,
-        'image_url': books_df['image'].values,
-        'preview_link': books_df['previewLink'].values,
-        'info_link': books_df['infoLink'].values,
-        'publisher': books_df['publisher'].fillna('').values,
-        'published_date': books_df['publishedDate'].fillna('').values,
-        'ratings_count': books_df['ratingsCount'].fillna(0).values,
-        'review_count': books_df['review_count'].values,
-        'avg_rating': books_df['avg_score'].values,
-        'embedding_text': books_df['embedding_text'].values
+        'id': np.arange(len(books_df), dtype=np.int32),
+        'title': books_df['title_clean'].to_numpy(dtype=object),
+        'description': books_df['description_clean'].to_numpy(dtype=object),
+        'authors': [orjson.dumps(authors).decode() for authors in books_df['authors_parsed'].to_list()],
+        'categories': [orjson.dumps(categories).decode() for categories in books_df['categories_parsed'].to_list()],
+        'image_url': books_df['image'].to_numpy(dtype=object, na_value=None),
+        'preview_link': books_df['previewLink'].to_numpy(dtype=object, na_value=None),
+        'info_link': books_df['infoLink'].to_numpy(dtype=object, na_value=None),
+        'publisher': books_df['publisher'].to_numpy(dtype=object, na_value=''),
+        'published_date': books_df['publishedDate'].to_numpy(dtype=object, na_value=''),
+        'ratings_count': np.where(np.isnan(ratings), 0, ratings).astype(np.int32),
+        'review_count': books_df['review_count'].to_numpy(dtype=np.int32),
+        'avg_rating': books_df['avg_score'].to_numpy(dtype=np.float64),
+        'embedding_text': books_df['embedding_text'].to_numpy(dtype=object)
     })
     
     # Save to CSV
@@ -225,6 +262,12 @@ def main():
     final_df.to_csv(output_path, index=False)
     print(f"   File size: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
     
+    # Save to Parquet (typed columns, fast re-reads for the upload scripts)
+    parquet_path = OUTPUT_DIR / 'books_clean.parquet'
+    print(f"   Saving to: {parquet_path}")
+    final_df.to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False)
+    print(f"   File size: {parquet_path.stat().st_size / 1024 / 1024:.2f} MB")
+    
     # Print statistics
     print("\n" + "=" * 60)
     print("Statistics:")
@@ -235,15 +278,12 @@ def main():
     print(f"Average reviews per book: {final_df['review_count'].mean():.2f}")
     print(f"Books with images: {final_df['image_url'].notna().sum():,}")
     
-    # Category statistics
-    all_categories = defaultdict(int)
-    for cats_json in final_df['categories']:
-        for cat in json.loads(cats_json):
-            all_categories[cat] += 1
+    # Category statistics (from the parsed lists, before JSON serialization)
+    category_counts = books_df['categories_parsed'].explode().dropna().value_counts()
     
-    print(f"Unique categories: {len(all_categories)}")
+    print(f"Unique categories: {len(category_counts)}")
     print("\nTop 10 categories:")
-    for cat, count in sorted(all_categories.items(), key=lambda x: x[1], reverse=True)[:10]:
+    for cat, count in category_counts.head(10).items():
         print(f"  - {cat}: {count:,}")
     
     print("\n" + "=" * 60)
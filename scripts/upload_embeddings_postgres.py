@@ -1,5 +1,7 @@
 """
 Fast embedding upload using direct PostgreSQL connection and COPY
+Streams all embeddings into a staging table with binary COPY and applies
+them with one UPDATE
 This is the fastest method - should take 2-3 minutes instead of hours
 """
 
@@ -10,8 +12,9 @@ import os
 from tqdm import tqdm
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import execute_values
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Load environment variables
 load_dotenv()
@@ -19,7 +22,37 @@ load_dotenv('.env.local')
 
 # Paths
 EMBEDDINGS_FILE = Path("data/processed/embeddings.npy")
-BOOKS_FILE = Path("data/processed/books_clean.csv")
+BOOKS_FILE = Path("data/processed/books_clean.parquet")
+
+# Parallel upload: one connection per worker, each handling a contiguous shard
+# (the pooler must allow this many concurrent sessions)
+NUM_WORKERS = 8
+COPY_BLOCK_SIZE = 10000
+
+# Send embeddings as pgvector halfvec (float16): half the COPY bytes, cast
+# back to vector on the server. Needs pgvector 0.7+ and rounds each value
+# to ~3 significant digits, so leave off unless bandwidth is the bottleneck
+HALF_PRECISION_WIRE = False
+
+# Vector indexes on books.embedding (as defined in migrations 002 and 009),
+# dropped during the bulk load and rebuilt once afterwards
+VECTOR_INDEXES = {
+    'books_embedding_idx': """
+        CREATE INDEX IF NOT EXISTS books_embedding_idx ON books
+        USING ivfflat (embedding vector_cosine_ops)
+        WITH (lists = 100)
+    """,
+    'idx_books_embedding_cosine': """
+        CREATE INDEX IF NOT EXISTS idx_books_embedding_cosine ON books
+        USING ivfflat (embedding vector_cosine_ops)
+        WHERE embedding IS NOT NULL
+    """,
+}
+
+# COPY BINARY framing: signature, flags and header-extension length, and
+# the int16 -1 trailer
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + np.array([0, 0], dtype='>i4').tobytes()
+PGCOPY_TRAILER = np.array([-1], dtype='>i2').tobytes()
 
 # Get Supabase connection details
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
@@ -52,6 +85,97 @@ def get_db_connection_string():
         'password': SUPABASE_DB_PASSWORD
     }
 
+def copy_row_dtype(dims, half=False):
+    """Big-endian COPY BINARY tuple layout for (idx integer, emb vector(dims))"""
+    return np.dtype([
+        ('nfields', '>i2'),
+        ('idx_len', '>i4'),
+        ('idx', '>i4'),
+        ('emb_len', '>i4'),
+        # pgvector binary format: int16 dim, int16 unused, float32[dim]
+        # (float16[dim] for halfvec)
+        ('dim', '>i2'),
+        ('unused', '>i2'),
+        ('vec', '>f2' if half else '>f4', (dims,)),
+    ])
+
+def encode_copy_binary(embeddings, book_ids, half=False):
+    """Encode (faiss_index, embedding) rows as one COPY BINARY payload"""
+    dims = embeddings.shape[1]
+    rows = np.empty(len(book_ids), dtype=copy_row_dtype(dims, half))
+    rows['nfields'] = 2
+    rows['idx_len'] = 4
+    rows['idx'] = book_ids
+    rows['emb_len'] = 4 + rows.dtype['vec'].base.itemsize * dims
+    rows['dim'] = dims
+    rows['unused'] = 0
+    rows['vec'] = embeddings[book_ids]
+    return PGCOPY_HEADER + rows.tobytes() + PGCOPY_TRAILER
+
+def upload_shard(config, embeddings, book_ids, progress, progress_lock):
+    """Binary-COPY one shard into a staging table and apply it with one UPDATE"""
+    # psycopg2 connections must not be shared between threads
+    conn = psycopg2.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            # One commit per shard; don't wait for the WAL flush on it
+            cursor.execute("SET LOCAL synchronous_commit = off")
+            
+            # Session-local staging table, dropped automatically on commit
+            emb_type = 'halfvec' if HALF_PRECISION_WIRE else 'vector'
+            cursor.execute(f"""
+                CREATE TEMP TABLE stage_emb (
+                    idx integer,
+                    emb {emb_type}({embeddings.shape[1]})
+                ) ON COMMIT DROP
+            """)
+            
+            # Stream binary rows (no float formatting or server-side parsing)
+            for start in range(0, len(book_ids), COPY_BLOCK_SIZE):
+                block = book_ids[start:start + COPY_BLOCK_SIZE]
+                payload = encode_copy_binary(embeddings, block, HALF_PRECISION_WIRE)
+                cursor.copy_expert("COPY stage_emb (idx, emb) FROM STDIN WITH (FORMAT binary)", io.BytesIO(payload))
+                with progress_lock:
+                    progress.update(len(block))
+            
+            cursor.execute("""
+                UPDATE books
+                SET embedding = s.emb::vector
+                FROM stage_emb s
+                WHERE books.faiss_index = s.idx
+            """)
+            updated = cursor.rowcount
+        conn.commit()
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def drop_vector_indexes(config):
+    """Drop the embedding indexes so the bulk UPDATE skips index maintenance"""
+    conn = psycopg2.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            for name in VECTOR_INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+    finally:
+        conn.close()
+
+def create_vector_indexes(config):
+    """Rebuild the embedding indexes once over the loaded vectors"""
+    conn = psycopg2.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL maintenance_work_mem = '1GB'")
+            for create_sql in VECTOR_INDEXES.values():
+                cursor.execute(create_sql)
+        conn.commit()
+    finally:
+        conn.close()
+
 def main():
     print("=" * 60)
     print("Fast Embedding Upload (Direct PostgreSQL)")
@@ -66,11 +190,11 @@ def main():
         return
     
     print("\n1. Loading embeddings...")
-    embeddings = np.load(EMBEDDINGS_FILE)
+    embeddings = np.load(EMBEDDINGS_FILE, mmap_mode='r')
     print(f"   Loaded {embeddings.shape[0]:,} embeddings ({embeddings.shape[1]} dims)")
     
     print("\n2. Loading books...")
-    books_df = pd.read_csv(BOOKS_FILE)
+    books_df = pd.read_parquet(BOOKS_FILE, columns=['id'])
     print(f"   Loaded {len(books_df):,} books")
     
     print("\n3. Connecting to PostgreSQL...")
@@ -95,12 +219,12 @@ def main():
         }
     ]
     
-    conn = None
+    db_settings = None
     for i, config in enumerate(connection_attempts):
         try:
             print(f"   Trying connection method {i+1}...")
-            conn = psycopg2.connect(**config)
-            cursor = conn.cursor()
+            psycopg2.connect(**config).close()
+            db_settings = config
             print(f"   ✓ Connected to database via {config['host']}")
             break
         except Exception as e:
@@ -114,57 +238,37 @@ def main():
                 return
             continue
     
-    print("\n4. Uploading embeddings (fast bulk operation)...")
+    print(f"\n4. Uploading embeddings ({NUM_WORKERS} parallel COPY + UPDATE shards)...")
     print("   This should take 2-3 minutes...")
+    if HALF_PRECISION_WIRE:
+        print("   Sending float16 (halfvec) embeddings")
+    
+    print("   Dropping vector indexes for the bulk load...")
+    drop_vector_indexes(db_settings)
+    
+    shards = np.array_split(books_df['id'].to_numpy(), NUM_WORKERS)
+    progress_lock = threading.Lock()
+    total_updated = 0
     
     try:
-        # Prepare data for bulk update
-        batch_size = 1000
-        total_updated = 0
-        
-        for i in tqdm(range(0, len(books_df), batch_size), desc="   Processing"):
-            batch = books_df.iloc[i:i+batch_size]
-            
-            # Prepare update values
-            update_data = []
-            for _, row in batch.iterrows():
-                book_id = int(row['id'])
-                embedding = embeddings[book_id].tolist()
-                # Format: (faiss_index, embedding_array)
-                update_data.append((book_id, embedding))
-            
-            # Use execute_values for fast batch update
-            # Create temp table approach for bulk update
-            query = """
-                UPDATE books 
-                SET embedding = data.emb::vector
-                FROM (VALUES %s) AS data(idx, emb)
-                WHERE books.faiss_index = data.idx
-            """
-            
-            try:
-                execute_values(
-                    cursor,
-                    query,
-                    [(idx, f'[{",".join(map(str, emb))}]') for idx, emb in update_data],
-                    template='(%s, %s)',
-                    page_size=100
-                )
-                conn.commit()
-                total_updated += len(update_data)
-            except Exception as e:
-                print(f"\n   ⚠️  Batch error: {str(e)[:100]}")
-                conn.rollback()
-                continue
+        with tqdm(total=len(books_df), desc="   Uploading") as progress:
+            with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+                futures = [
+                    executor.submit(upload_shard, db_settings, embeddings, shard, progress, progress_lock)
+                    for shard in shards if len(shard)
+                ]
+                for future in as_completed(futures):
+                    try:
+                        total_updated += future.result()
+                    except Exception as e:
+                        print(f"\n   ⚠️  Shard error: {str(e)[:100]}")
         
         print(f"\n   ✓ Successfully updated {total_updated:,} books!")
-        
-    except Exception as e:
-        print(f"\n   ❌ Error: {e}")
-        conn.rollback()
     finally:
-        cursor.close()
-        conn.close()
+        # Rebuild even after a partial load so search keeps its indexes
+        print("\n5. Rebuilding vector indexes...")
+        create_vector_indexes(db_settings)
+        print("   ✓ Indexes rebuilt")
     
     print("\n" + "=" * 60)
     print("✓ Upload complete!")
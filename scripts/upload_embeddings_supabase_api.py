@@ -1,13 +1,17 @@
 """
 Upload embeddings using Supabase Python API
 More reliable than direct PostgreSQL when network/DNS issues exist
+Sends embeddings in large chunks to the bulk_update_embeddings RPC
+(migration 010), several requests in flight at once
 """
 
 import numpy as np
-import pandas as pd
+import pyarrow.parquet as pq
 from pathlib import Path
-from supabase import create_client
+import httpx
+import asyncio
 import os
+import random
 from tqdm import tqdm
 from dotenv import load_dotenv
 import time
@@ -18,13 +22,66 @@ if env_local.exists():
     load_dotenv('.env.local', override=True)
 
 # Paths
-EMBEDDINGS_FILE = Path("data/processed/embeddings.npy")
-BOOKS_FILE = Path("data/processed/books_clean.csv")
+# Books + float32 embeddings in one file (written by prepare_embeddings_csv.py)
+BOOKS_FILE = Path("data/processed/books_with_embeddings.parquet")
+
+# Books per RPC call (keeps each request well under the API statement timeout)
+RPC_BATCH_SIZE = 1000
+MAX_RETRIES = 3
+# Retry waits grow 0.1s, 0.2s, 0.4s... (randomized, capped) so concurrent
+# batches hitting a rate limit don't all come back at the same moment
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 2.0
+# Concurrent RPC requests (bounded so the database isn't flooded)
+MAX_CONCURRENT_REQUESTS = 8
+# Bulk RPCs may run long, but a dead connection should fail fast
+REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
 
 # Supabase credentials (tries multiple env var names)
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 
+async def upload_batch(client, semaphore, batch_ids, batch_embeddings, progress):
+    """Send one chunk to the bulk RPC; returns (updated, failed)"""
+    async with semaphore:
+        # Build the payload only once a slot is free, to bound memory
+        params = {
+            'faiss_indices': batch_ids.tolist(),
+            'embeddings': batch_embeddings.tolist()
+        }
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = await client.post('/rest/v1/rpc/bulk_update_embeddings', json=params)
+                response.raise_for_status()
+                progress.update(len(batch_ids))
+                return response.json(), 0
+            except httpx.HTTPError as e:
+                if attempt == MAX_RETRIES - 1:
+                    print(f"\n   ⚠️  Batch starting at book {batch_ids[0]} failed: {str(e)[:80]}")
+                    progress.update(len(batch_ids))
+                    return 0, len(batch_ids)
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+async def upload_all(book_ids, embeddings):
+    """Upload all chunks with at most MAX_CONCURRENT_REQUESTS in flight"""
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}'
+    }
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with httpx.AsyncClient(base_url=SUPABASE_URL, headers=headers, timeout=REQUEST_TIMEOUT) as client:
+        with tqdm(total=len(book_ids), desc="   Uploading") as progress:
+            results = await asyncio.gather(*(
+                upload_batch(client, semaphore, book_ids[i:i+RPC_BATCH_SIZE], embeddings[i:i+RPC_BATCH_SIZE], progress)
+                for i in range(0, len(book_ids), RPC_BATCH_SIZE)
+            ))
+    
+    total_updated = sum(updated for updated, _ in results)
+    failed = sum(failed for _, failed in results)
+    return total_updated, failed
+
 def main():
     print("=" * 60)
     print("Embedding Upload via Supabase API")
@@ -42,60 +99,23 @@ def main():
         print("\nGet them from: Supabase Dashboard > Settings > API")
         return
     
-    print("\n1. Loading embeddings...")
-    embeddings = np.load(EMBEDDINGS_FILE)
-    print(f"   Loaded {embeddings.shape[0]:,} embeddings")
-    
-    print("\n2. Loading books...")
-    books_df = pd.read_csv(BOOKS_FILE)
-    print(f"   Loaded {len(books_df):,} books")
-    
-    print("\n3. Connecting to Supabase...")
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("   ✓ Connected")
+    print("\n1. Loading books with embeddings...")
+    if not BOOKS_FILE.exists():
+        print(f"   ❌ File not found: {BOOKS_FILE}")
+        print("   Run scripts/prepare_embeddings_csv.py first")
+        return
     
-    print("\n4. Uploading embeddings...")
-    print("   Using batch size of 10 for reliability...")
-    print("   Estimated time: 45-60 minutes")
-    print("   (This is slow but reliable - grab a coffee! ☕)")
+    table = pq.read_table(BOOKS_FILE, columns=['id', 'embedding'])
+    book_ids = table['id'].to_numpy()
+    # Fixed-size list column -> (books x dims) float32 view of the same buffer
+    embeddings = table['embedding'].combine_chunks().flatten().to_numpy().reshape(len(table), -1)
+    print(f"   Loaded {len(book_ids):,} books ({embeddings.shape[1]} dims)")
     
-    batch_size = 10  # Small batches for maximum reliability
-    total_updated = 0
-    failed = 0
+    print("\n2. Uploading embeddings...")
+    print(f"   Using bulk RPC calls of {RPC_BATCH_SIZE:,} books, {MAX_CONCURRENT_REQUESTS} at a time...")
     
     start_time = time.time()
-    
-    for i in tqdm(range(0, len(books_df), batch_size), desc="   Uploading"):
-        batch = books_df.iloc[i:i+batch_size]
-        
-        for _, row in batch.iterrows():
-            try:
-                book_id = int(row['id'])
-                embedding = embeddings[book_id].tolist()
-                
-                # Update one at a time with retry
-                for attempt in range(2):
-                    try:
-                        supabase.table('books').update({
-                            'embedding': embedding
-                        }).eq('faiss_index', book_id).execute()
-                        total_updated += 1
-                        break
-                    except Exception as e:
-                        if attempt == 1:
-                            failed += 1
-                        time.sleep(0.1)
-                        
-            except Exception as e:
-                failed += 1
-                continue
-        
-        # Progress update every 100 books
-        if (i + batch_size) % 100 == 0:
-            elapsed = (time.time() - start_time) / 60
-            rate = total_updated / elapsed if elapsed > 0 else 0
-            remaining = (len(books_df) - total_updated) / rate if rate > 0 else 0
-            print(f"\n   Progress: {total_updated:,} done | {failed} failed | ~{remaining:.0f} min remaining")
+    total_updated, failed = asyncio.run(upload_all(book_ids, embeddings))
     
     elapsed_total = (time.time() - start_time) / 60
     print(f"\n   ✓ Complete in {elapsed_total:.1f} minutes")
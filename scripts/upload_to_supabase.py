@@ -4,7 +4,10 @@ Uploads processed books data and FAISS index to Supabase
 """
 
 import pandas as pd
-import json
+import base64
+import mmap
+import httpx
+import orjson
 from pathlib import Path
 from supabase import create_client, Client
 import os
@@ -19,10 +22,80 @@ BOOKS_FILE = Path("data/processed/books_clean.csv")
 INDEX_FILE = Path("data/processed/books_faiss.index")
 METADATA_FILE = Path("data/processed/books_metadata.json")
 
+# Resumable (tus) storage uploads: Supabase requires 6 MB chunks
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 60.0
+
 # Supabase credentials
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Use service key for uploads
 
+def build_records(books_df):
+    """Build all book insert payloads with column operations (no per-row Series)"""
+    records_df = pd.DataFrame({
+        'title': books_df['title'],
+        'description': books_df['description'],
+        'authors': books_df['authors'].map(orjson.loads),
+        'categories': books_df['categories'].map(orjson.loads),
+        'image_url': books_df['image_url'],
+        'preview_link': books_df['preview_link'],
+        'publisher': books_df['publisher'],
+        'published_date': books_df['published_date'],
+        'ratings_count': books_df['ratings_count'].fillna(0).astype(int),
+        'avg_rating': books_df['avg_rating'].fillna(0.0).astype(float),
+        'faiss_index': books_df['id'].astype(int)
+    })
+    # Missing values go out as JSON null instead of NaN
+    return records_df.astype(object).where(records_df.notna(), None).to_dict(orient='records')
+
+def upload_resumable(bucket, object_name, path, content_type):
+    """Upload a file in fixed-size chunks via Supabase's resumable (tus) endpoint"""
+    size = path.stat().st_size
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Tus-Resumable': '1.0.0'
+    }
+    metadata = {'bucketName': bucket, 'objectName': object_name, 'contentType': content_type}
+    
+    with httpx.Client(base_url=SUPABASE_URL, headers=headers, timeout=REQUEST_TIMEOUT) as client, \
+            open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # Create the upload; the server returns its URL in Location
+        response = client.post('/storage/v1/upload/resumable', headers={
+            'Upload-Length': str(size),
+            'Upload-Metadata': ','.join(
+                f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+            ),
+            'x-upsert': 'true'
+        })
+        response.raise_for_status()
+        upload_url = response.headers['Location']
+        
+        # Send chunks straight from the mapped file; on failure, ask the
+        # server how much it kept and resume from there
+        offset = 0
+        retries = 0
+        with tqdm(total=size, unit='B', unit_scale=True, desc="   Uploading") as progress:
+            while offset < size:
+                try:
+                    response = client.patch(upload_url, content=data[offset:offset + TUS_CHUNK_SIZE], headers={
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream'
+                    })
+                    response.raise_for_status()
+                    new_offset = int(response.headers['Upload-Offset'])
+                except httpx.HTTPError:
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        raise
+                    new_offset = int(client.head(upload_url).headers['Upload-Offset'])
+                progress.update(new_offset - offset)
+                offset = new_offset
+    
+    return size
+
 def main():
     print("=" * 60)
     print("BookDNA Supabase Upload")
@@ -51,25 +124,11 @@ def main():
     batch_size = 100
     total_uploaded = 0
     
-    for i in tqdm(range(0, len(books_df), batch_size), desc="   Uploading batches"):
-        batch = books_df.iloc[i:i+batch_size]
-        
-        # Prepare batch data
-        records = []
-        for idx, row in batch.iterrows():
-            records.append({
-                'title': row['title'],
-                'description': row['description'],
-                'authors': json.loads(row['authors']),
-                'categories': json.loads(row['categories']),
-                'image_url': row['image_url'],
-                'preview_link': row['preview_link'],
-                'publisher': row['publisher'],
-                'published_date': row['published_date'],
-                'ratings_count': int(row['ratings_count']) if not pd.isna(row['ratings_count']) else 0,
-                'avg_rating': float(row['avg_rating']) if not pd.isna(row['avg_rating']) else 0.0,
-                'faiss_index': int(row['id'])
-            })
+    # Prepare all records at once
+    all_records = build_records(books_df)
+    
+    for i in tqdm(range(0, len(all_records), batch_size), desc="   Uploading batches"):
+        records = all_records[i:i+batch_size]
         
         # Upload batch
         try:
@@ -86,17 +145,10 @@ def main():
     
     if INDEX_FILE.exists():
         try:
-            with open(INDEX_FILE, 'rb') as f:
-                index_data = f.read()
+            # Upload to storage bucket in resumable chunks
+            index_size = upload_resumable('indexes', 'books_faiss.index', INDEX_FILE, 'application/octet-stream')
             
-            # Upload to storage bucket
-            result = supabase.storage.from_('indexes').upload(
-                'books_faiss.index',
-                index_data,
-                {'content-type': 'application/octet-stream'}
-            )
-            
-            file_size_mb = len(index_data) / 1024 / 1024
+            file_size_mb = index_size / 1024 / 1024
             print(f"   ✓ Uploaded FAISS index ({file_size_mb:.2f} MB)")
         except Exception as e:
             print(f"   ⚠️  Error uploading index: {e}")
@@ -109,14 +161,13 @@ def main():
     
     if METADATA_FILE.exists():
         try:
-            with open(METADATA_FILE, 'r', encoding='utf-8') as f:
-                metadata_data = f.read()
-            
-            result = supabase.storage.from_('indexes').upload(
-                'books_metadata.json',
-                metadata_data.encode('utf-8'),
-                {'content-type': 'application/json'}
-            )
+            # Hand over the open file so it is streamed rather than read into memory
+            with open(METADATA_FILE, 'rb') as f:
+                result = supabase.storage.from_('indexes').upload(
+                    'books_metadata.json',
+                    f,
+                    {'content-type': 'application/json'}
+                )
             
             print(f"   ✓ Uploaded metadata")
         except Exception as e:
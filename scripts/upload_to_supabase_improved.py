@@ -4,7 +4,10 @@ Uploads processed books data and FAISS index to Supabase with better error handl
 """
 
 import pandas as pd
-import json
+import base64
+import mmap
+import httpx
+import orjson
 from pathlib import Path
 from supabase import create_client, Client
 import os
@@ -21,10 +24,80 @@ BOOKS_FILE = Path("data/processed/books_clean.csv")
 INDEX_FILE = Path("data/processed/books_faiss.index")
 METADATA_FILE = Path("data/processed/books_metadata.json")
 
+# Resumable (tus) storage uploads: Supabase requires 6 MB chunks
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 60.0
+
 # Supabase credentials - try multiple env var names
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 
+def build_records(books_df):
+    """Build all book insert payloads with column operations (no per-row Series)"""
+    records_df = pd.DataFrame({
+        'title': books_df['title'].astype(str).str.slice(0, 500),  # Limit string length
+        'description': books_df['description'].fillna('').astype(str).str.slice(0, 2000),
+        'authors': books_df['authors'].fillna('[]').map(orjson.loads),
+        'categories': books_df['categories'].fillna('[]').map(orjson.loads),
+        'image_url': books_df['image_url'],
+        'preview_link': books_df['preview_link'],
+        'publisher': books_df['publisher'].fillna('').astype(str).str.slice(0, 200),
+        'published_date': books_df['published_date'].fillna('').astype(str).str.slice(0, 50),
+        'ratings_count': books_df['ratings_count'].fillna(0).astype(int),
+        'avg_rating': books_df['avg_rating'].fillna(0.0).astype(float),
+        'faiss_index': books_df['id'].astype(int)
+    })
+    # Missing links go out as JSON null instead of NaN
+    return records_df.astype(object).where(records_df.notna(), None).to_dict(orient='records')
+
+def upload_resumable(bucket, object_name, path, content_type):
+    """Upload a file in fixed-size chunks via Supabase's resumable (tus) endpoint"""
+    size = path.stat().st_size
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Tus-Resumable': '1.0.0'
+    }
+    metadata = {'bucketName': bucket, 'objectName': object_name, 'contentType': content_type}
+    
+    with httpx.Client(base_url=SUPABASE_URL, headers=headers, timeout=REQUEST_TIMEOUT) as client, \
+            open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # Create the upload; the server returns its URL in Location
+        response = client.post('/storage/v1/upload/resumable', headers={
+            'Upload-Length': str(size),
+            'Upload-Metadata': ','.join(
+                f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+            ),
+            'x-upsert': 'true'
+        })
+        response.raise_for_status()
+        upload_url = response.headers['Location']
+        
+        # Send chunks straight from the mapped file; on failure, ask the
+        # server how much it kept and resume from there
+        offset = 0
+        retries = 0
+        with tqdm(total=size, unit='B', unit_scale=True, desc="   Uploading") as progress:
+            while offset < size:
+                try:
+                    response = client.patch(upload_url, content=data[offset:offset + TUS_CHUNK_SIZE], headers={
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream'
+                    })
+                    response.raise_for_status()
+                    new_offset = int(response.headers['Upload-Offset'])
+                except httpx.HTTPError:
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        raise
+                    new_offset = int(client.head(upload_url).headers['Upload-Offset'])
+                progress.update(new_offset - offset)
+                offset = new_offset
+    
+    return size
+
 def main():
     print("=" * 60)
     print("BookDNA Supabase Upload (Improved)")
@@ -68,29 +141,11 @@ def main():
     total_uploaded = 0
     failed_batches = []
     
-    for i in tqdm(range(0, len(books_df), batch_size), desc="   Uploading"):
-        batch = books_df.iloc[i:i+batch_size]
-        
-        # Prepare batch data
-        records = []
-        for idx, row in batch.iterrows():
-            try:
-                records.append({
-                    'title': str(row['title'])[:500],  # Limit string length
-                    'description': str(row['description'])[:2000] if pd.notna(row['description']) else '',
-                    'authors': json.loads(row['authors']) if pd.notna(row['authors']) else [],
-                    'categories': json.loads(row['categories']) if pd.notna(row['categories']) else [],
-                    'image_url': str(row['image_url']) if pd.notna(row['image_url']) else None,
-                    'preview_link': str(row['preview_link']) if pd.notna(row['preview_link']) else None,
-                    'publisher': str(row['publisher'])[:200] if pd.notna(row['publisher']) else '',
-                    'published_date': str(row['published_date'])[:50] if pd.notna(row['published_date']) else '',
-                    'ratings_count': int(row['ratings_count']) if pd.notna(row['ratings_count']) else 0,
-                    'avg_rating': float(row['avg_rating']) if pd.notna(row['avg_rating']) else 0.0,
-                    'faiss_index': int(row['id'])
-                })
-            except Exception as e:
-                print(f"\n   ⚠️  Error preparing record at index {idx}: {e}")
-                continue
+    # Prepare all records at once
+    all_records = build_records(books_df)
+    
+    for i in tqdm(range(0, len(all_records), batch_size), desc="   Uploading"):
+        records = all_records[i:i+batch_size]
         
         # Upload batch with retry
         max_retries = 3
@@ -133,24 +188,11 @@ def main():
     
     if INDEX_FILE.exists():
         try:
-            print(f"   Reading {INDEX_FILE.stat().st_size / 1024 / 1024:.2f} MB file...")
-            with open(INDEX_FILE, 'rb') as f:
-                index_data = f.read()
+            print(f"   Uploading {INDEX_FILE.stat().st_size / 1024 / 1024:.2f} MB file in resumable chunks...")
+            # Upserts in place, so the old index stays until the new one is complete
+            index_size = upload_resumable('indexes', 'books_faiss.index', INDEX_FILE, 'application/octet-stream')
             
-            print("   Uploading to storage...")
-            # Try to remove existing file first
-            try:
-                supabase.storage.from_('indexes').remove(['books_faiss.index'])
-            except:
-                pass
-            
-            result = supabase.storage.from_('indexes').upload(
-                'books_faiss.index',
-                index_data,
-                {'content-type': 'application/octet-stream', 'upsert': 'true'}
-            )
-            
-            file_size_mb = len(index_data) / 1024 / 1024
+            file_size_mb = index_size / 1024 / 1024
             print(f"   ✓ Uploaded FAISS index ({file_size_mb:.2f} MB)")
         except Exception as e:
             print(f"   ❌ Error uploading index: {e}")
@@ -162,20 +204,19 @@ def main():
     
     if METADATA_FILE.exists():
         try:
-            with open(METADATA_FILE, 'r', encoding='utf-8') as f:
-                metadata_data = f.read()
-            
             # Try to remove existing file first
             try:
                 supabase.storage.from_('indexes').remove(['books_metadata.json'])
             except:
                 pass
             
-            result = supabase.storage.from_('indexes').upload(
-                'books_metadata.json',
-                metadata_data.encode('utf-8'),
-                {'content-type': 'application/json', 'upsert': 'true'}
-            )
+            # Hand over the open file so it is streamed rather than read into memory
+            with open(METADATA_FILE, 'rb') as f:
+                result = supabase.storage.from_('indexes').upload(
+                    'books_metadata.json',
+                    f,
+                    {'content-type': 'application/json', 'upsert': 'true'}
+                )
             
             print(f"   ✓ Uploaded metadata")
         except Exception as e:
@@ -0,0 +1,23 @@
+-- Bulk embedding upload: set many books' embeddings in one call
+-- Used by scripts/upload_embeddings_supabase_api.py instead of one REST request per book
+
+CREATE OR REPLACE FUNCTION bulk_update_embeddings(
+  faiss_indices int[],
+  embeddings jsonb
+)
+RETURNS int
+LANGUAGE sql
+AS $$
+  -- embeddings[i] (a JSON array of floats) belongs to the book with faiss_indices[i]
+  WITH updated AS (
+    UPDATE books
+    SET embedding = (e.value)::text::vector
+    FROM jsonb_array_elements(embeddings) WITH ORDINALITY AS e(value, ord)
+    WHERE books.faiss_index = faiss_indices[e.ord]
+    RETURNING 1
+  )
+  SELECT count(*)::int FROM updated;
+$$;
+
+-- Add helpful comment
+COMMENT ON FUNCTION bulk_update_embeddings IS 'Set embeddings for many books at once, matched by faiss_index';